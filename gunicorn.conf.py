@@ -0,0 +1,16 @@
+# Pornire în producție:  gunicorn main:app
+# (gunicorn citește automat acest fișier din directorul curent)
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Aplicația așteaptă aproape tot timpul după TMDB, deci folosim thread-uri:
+# fiecare worker poate avea multe request-uri în curs simultan.
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "gthread"
+# main.py dimensionează pool-ul de conexiuni TMDB din aceeași variabilă,
+# deci setează GUNICORN_THREADS, nu `--threads` direct.
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+timeout = 30
+keepalive = 5
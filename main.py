@@ -1,7 +1,19 @@
+import functools
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from types import MappingProxyType
+
+import orjson
+import redis
 import requests
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, abort
+from flask import Flask, render_template, request, abort, make_response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ---------------------------------------------------
 # CONFIG & TMDB
@@ -16,9 +28,23 @@ if not TMDB_API_KEY:
 
 app = Flask(__name__)
 
+
+class TMDBUnavailable(Exception):
+    """TMDB nu a răspuns corect (rețea, 5xx, 429...) nici după reîncercări."""
+
+
 TMDB_BASE_URL = "https://api.themoviedb.org/3"
 TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/w342"  # pentru postere
 
+# Endpoint-uri TMDB (path-uri relative la TMDB_BASE_URL)
+GENRES_PATH = "/genre/movie/list"
+SEARCH_PATH = "/search/movie"
+DISCOVER_PATH = "/discover/movie"
+MOVIE_PATH = "/movie/{}".format
+
+# Parametri impliciți pentru orice apel (api_key e pus pe sesiune).
+DEFAULT_PARAMS = MappingProxyType({"language": "en-US"})
+
 # Regiuni suportate (EU + US)
 REGIONS = [
     ("IE", "Ireland"),
@@ -40,34 +66,204 @@ REGIONS = [
     ("BG", "Bulgaria"),
 ]
 
-DEFAULT_REGION = "IE"   # aici poți schimba regiunea implicită
-
+REGION_NAMES = dict(REGIONS)
+VALID_REGION_CODES = frozenset(REGION_NAMES)
 
-def tmdb_get(path, params=None):
-    """Apel simplu la TMDB."""
-    if params is None:
-        params = {}
+DEFAULT_REGION = "IE"   # aici poți schimba regiunea implicită
 
-    params["api_key"] = TMDB_API_KEY
-    params.setdefault("language", "en-US")
+# Versiunea template-ului de detalii intră în ETag, ca un deploy care
+# schimbă HTML-ul să nu mai primească 304 pentru pagina veche.
+with open(os.path.join(app.root_path, "templates", "detail.html"), "rb") as f:
+    DETAIL_TEMPLATE_VERSION = hashlib.blake2b(f.read(), digest_size=8).digest()
+
+# Câte request-uri pot rula simultan într-un proces; aceeași variabilă ca
+# `threads` din gunicorn.conf.py. Pool-ul de conexiuni TMDB trebuie să fie
+# cel puțin atât de mare, altfel urllib3 aruncă conexiunile keep-alive.
+WORKER_THREADS = int(os.getenv("GUNICORN_THREADS", "32"))
+
+# O singură sesiune HTTP pentru toate apelurile TMDB: conexiunile keep-alive
+# (și handshake-ul TLS) sunt refolosite între request-uri.
+TMDB = requests.Session()
+TMDB.params = {"api_key": TMDB_API_KEY}
+TMDB.headers.update({
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+})
+TMDB.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=WORKER_THREADS,
+        # timeout-urile se reîncearcă o singură dată; 429/5xx până la 5 ori
+        max_retries=Retry(
+            total=5,
+            connect=1,
+            read=1,
+            backoff_factor=0.25,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        ),
+    ),
+)
+
+# (connect, read) în secunde, per încercare.
+TMDB_TIMEOUT = (3.05, 5)
+
+# Cache Redis (opțional) pentru răspunsurile TMDB brute. Fără REDIS_URL
+# aplicația merge direct la TMDB, ca înainte.
+REDIS_URL = os.getenv("REDIS_URL")
+# Timeout-uri scurte: un Redis lent nu trebuie să blocheze request-urile.
+redis_client = (
+    redis.Redis.from_url(
+        REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2
+    )
+    if REDIS_URL else None
+)
+
+# TTL (secunde) în funcție de prefixul path-ului TMDB.
+CACHE_TTLS = (
+    ("/genre/", 7 * 24 * 60 * 60),
+    ("/movie/", 24 * 60 * 60),
+    ("/search/", 5 * 60),
+    ("/discover/", 60 * 60),
+)
+
+# Request-uri TMDB în curs, după cheia de cache: dacă mai mulți vizitatori
+# cer același lucru simultan, doar primul merge la TMDB, ceilalți așteaptă.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def ttl_cache(ttl, maxsize=128):
+    """Cache LRU în memorie cu expirare după `ttl` secunde.
+
+    Rezultatele goale (None, {}, []) nu se salvează, ca o eroare TMDB
+    să nu rămână în cache până la expirare.
+    """
+
+    def decorator(func):
+        entries = OrderedDict()  # key -> (value, expires_at)
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            with lock:
+                hit = entries.get(key)
+                if hit is not None and hit[1] > now:
+                    entries.move_to_end(key)
+                    return hit[0]
+
+            value = func(*args, **kwargs)
+            if value:
+                with lock:
+                    entries[key] = (value, now + ttl)
+                    entries.move_to_end(key)
+                    while len(entries) > maxsize:
+                        entries.popitem(last=False)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def cache_ttl(path):
+    for prefix, ttl in CACHE_TTLS:
+        if path.startswith(prefix):
+            return ttl
+    return None
+
+
+def tmdb_get(path, params=None, cache=True):
+    """Apel simplu la TMDB, cu cache Redis dacă e configurat."""
+    query = dict(DEFAULT_PARAMS)
+    if params:
+        query.update(params)
+
+    # cheia nu include api_key
+    key = f"tmdb:{path}:{sorted(query.items())}"
+    ttl = cache_ttl(path) if cache and redis_client is not None else None
+
+    if ttl:
+        try:
+            cached = redis_client.get(key)
+        except redis.RedisError as exc:
+            app.logger.warning("Redis error: op=get key=%s error=%s", key, exc)
+            cached = None
+        if cached:
+            return orjson.loads(cached)
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        return future.result()
+
+    try:
+        data = _tmdb_fetch(path, query, key, ttl)
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(data)
+        return data
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+
+def _tmdb_fetch(path, params, key, ttl):
+    try:
+        resp = TMDB.get(TMDB_BASE_URL + path, params=params, timeout=TMDB_TIMEOUT)
+    except requests.RequestException as exc:
+        # nu logăm exc: mesajul conține URL-ul cu api_key
+        app.logger.warning(
+            "TMDB request failed: path=%s error=%s", path, type(exc).__name__
+        )
+        raise TMDBUnavailable(path) from None
 
-    resp = requests.get(f"{TMDB_BASE_URL}{path}", params=params, timeout=10)
     if resp.status_code == 200:
-        return resp.json()
-
-    print("TMDB error:", resp.status_code, resp.text)
-    return {}
+        data = orjson.loads(resp.content)
+        if ttl:
+            try:
+                redis_client.setex(key, ttl, orjson.dumps(data))
+            except redis.RedisError as exc:
+                app.logger.warning("Redis error: op=setex key=%s error=%s", key, exc)
+        return data
+
+    # aici ajungem doar după ce Retry a epuizat reîncercările (sau 4xx)
+    app.logger.warning(
+        "TMDB error: path=%s status=%s body=%s",
+        path, resp.status_code, resp.text[:200],
+    )
+    if resp.status_code == 404:
+        return {}
+    raise TMDBUnavailable(path)
 
 
 # ---------------------------------------------------
 # LOGICĂ TMDB
 # ---------------------------------------------------
 
+@ttl_cache(ttl=24 * 60 * 60, maxsize=1)
 def get_genres():
-    data = tmdb_get("/genre/movie/list")
+    data = tmdb_get(GENRES_PATH)
     return data.get("genres", [])
 
 
+@ttl_cache(ttl=24 * 60 * 60, maxsize=1)
+def get_genre_names():
+    """{id: nume} pentru genuri, ca lookup-ul din /search să fie O(1)."""
+    return {g["id"]: g["name"] for g in get_genres()}
+
+
 def search_movies(title=None, genre_id=None, year=None):
     """Search endpoint logic."""
     if title:
@@ -75,7 +271,7 @@ def search_movies(title=None, genre_id=None, year=None):
         if year:
             params["year"] = year
 
-        data = tmdb_get("/search/movie", params)
+        data = tmdb_get(SEARCH_PATH, params)
         results = data.get("results", [])
 
         if genre_id:
@@ -87,17 +283,28 @@ def search_movies(title=None, genre_id=None, year=None):
         if year:
             params["primary_release_year"] = year
 
-        data = tmdb_get("/discover/movie", params)
+        data = tmdb_get(DISCOVER_PATH, params)
         results = data.get("results", [])
 
     return results
 
 
+def provider_names(region_info, kind):
+    """Numele providerilor dintr-o categorie (flatrate / buy / rent)."""
+    return [
+        name
+        for p in region_info.get(kind) or ()
+        if (name := p.get("provider_name"))
+    ]
+
+
+# providerii se schimbă cel mult zilnic; cache per (movie_id, region)
+@ttl_cache(ttl=60 * 60, maxsize=4096)
 def get_movie_details(movie_id, region=DEFAULT_REGION):
     """Detalii film + trailer + where to watch (în funcție de regiune)."""
 
     data = tmdb_get(
-        f"/movie/{movie_id}",
+        MOVIE_PATH(movie_id),
         params={"append_to_response": "videos,watch/providers"},
     )
 
@@ -118,18 +325,10 @@ def get_movie_details(movie_id, region=DEFAULT_REGION):
     providers_root = data.get("watch/providers", {}).get("results", {})
     region_info = providers_root.get(region, {}) if isinstance(providers_root, dict) else {}
 
-    flatrate = region_info.get("flatrate", []) or []
-    buy = region_info.get("buy", []) or []
-    rent = region_info.get("rent", []) or []
-
-    # extract provider names
-    def provider_names(group):
-        return [p.get("provider_name") for p in group if p.get("provider_name")]
-
     where_to_watch = {
-        "stream": provider_names(flatrate),
-        "buy": provider_names(buy),
-        "rent": provider_names(rent),
+        "stream": provider_names(region_info, "flatrate"),
+        "buy": provider_names(region_info, "buy"),
+        "rent": provider_names(region_info, "rent"),
     }
 
     movie = {
@@ -158,9 +357,18 @@ def get_movie_details(movie_id, region=DEFAULT_REGION):
 # ROUTE-URI FLASK
 # ---------------------------------------------------
 
+@app.errorhandler(TMDBUnavailable)
+def tmdb_unavailable(exc):
+    return "TMDB is not responding right now. Please try again later.", 502
+
+
 @app.route("/", methods=["GET"])
 def index():
-    genres = get_genres()
+    # formularul merge și fără genuri, deci nu dăm 502 pe pagina principală
+    try:
+        genres = get_genres()
+    except TMDBUnavailable:
+        genres = []
     return render_template("index.html", genres=genres)
 
 
@@ -173,13 +381,7 @@ def search():
     genre_id = int(genre_id_raw) if genre_id_raw.isdigit() else None
     year = int(year_raw) if year_raw.isdigit() else None
 
-    genres = get_genres()
-    genre_name = None
-    if genre_id:
-        for g in genres:
-            if g["id"] == genre_id:
-                genre_name = g["name"]
-                break
+    genre_name = get_genre_names().get(genre_id) if genre_id else None
 
     tmdb_results = search_movies(title=title or None, genre_id=genre_id, year=year)
 
@@ -214,21 +416,36 @@ def movie_detail(movie_id):
     region = request.args.get("region", DEFAULT_REGION)
 
     # validăm regiunea
-    valid_codes = {code for code, _ in REGIONS}
-    if region not in valid_codes:
+    if region not in VALID_REGION_CODES:
         region = DEFAULT_REGION
 
     movie = get_movie_details(movie_id, region=region)
     if not movie:
         abort(404)
 
-    return render_template(
-        "detail.html",
-        movie=movie,
-        region=region,
-        regions=REGIONS,
-    )
+    # ETag din datele filmului (include regiunea) + versiunea template-ului:
+    # dacă browserul are deja pagina, răspundem 304 fără să mai randăm.
+    etag = hashlib.blake2b(
+        DETAIL_TEMPLATE_VERSION
+        + orjson.dumps(movie, option=orjson.OPT_SORT_KEYS),
+        digest_size=16,
+    ).hexdigest()
+
+    if request.if_none_match.contains_weak(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = make_response(render_template(
+            "detail.html",
+            movie=movie,
+            region=region,
+            regions=REGIONS,
+        ))
+
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 300
+    return resp
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    app.run()
\ No newline at end of file